@@ -6,11 +6,10 @@
 #-----------------------------------------------------------------------------#
 
 
+import binascii
 import collections
 import doctest
-import functools
-import random
-import string
+import os
 import sys
 
 from pymemcache.client.base import Client
@@ -20,9 +19,10 @@ MemcacheServer = collections.namedtuple('MemcacheServer', ('hostname', 'port'))
 
 
 class Base(object):
+    __slots__ = ('memcache', 'key')
+
     _DEFAULT_MEMCACHE_SERVER = MemcacheServer(hostname='localhost', port=11211)
     _RANDOM_KEY_PREFIX = 'tmp:base:'
-    _RANDOM_KEY_CHARS = ''.join((string.digits, string.ascii_lowercase))
     _RANDOM_KEY_LENGTH = 16
 
     def __init__(self, memcache=None, key=None):
@@ -39,8 +39,10 @@ class Base(object):
 
     @classmethod
     def _random_key(cls):
-        random_char = functools.partial(random.choice, cls._RANDOM_KEY_CHARS)
-        suffix = ''.join(random_char() for _ in xrange(cls._RANDOM_KEY_LENGTH))
+        # Hex-encode random bytes in one shot, rather than pick random chars
+        # one at a time.  Each byte encodes to 2 hex digits.
+        random_bytes = os.urandom(cls._RANDOM_KEY_LENGTH // 2)
+        suffix = binascii.hexlify(random_bytes)
         random_key = ''.join((cls._RANDOM_KEY_PREFIX, suffix))
         return random_key
 
@@ -6,10 +6,14 @@
 #-----------------------------------------------------------------------------#
 
 
+import collections
+import contextlib
 import functools
 import itertools
 import json
 import math
+import struct
+from multiprocessing.pool import ThreadPool
 
 import mmh3
 from bitarray import bitarray
@@ -18,6 +22,15 @@ from .base import Base, run_doctests
 from .exceptions import CheckAndSetError
 
 
+# Unpack a 128-bit MurmurHash digest into two unsigned 64-bit hashes.
+_HASH_HALVES = struct.Struct('<QQ')
+
+# Multiplier for the 64-bit linear congruential generator that we step to
+# derive a value's bit offsets within its block (from Knuth's MMIX).
+_LCG_MULTIPLIER = 6364136223846793005
+_LCG_MASK = (1 << 64) - 1
+
+
 class BloomFilter(Base):
     '''Memcache-backed Bloom filter with an API similar to Python sets.
 
@@ -94,19 +107,85 @@ class BloomFilter(Base):
     Bloom filter to Memcache, inserting another element, storing the Bloom
     filter to Memcache again, etc.).
 
+    If you can't gather up all of your elements before inserting them, then
+    batch up your insertions instead:
+
+        >>> with dilberts.batched():
+        ...     dilberts.add('eric')
+        ...     dilberts.add('jenny')
+        >>> 'jenny' in dilberts
+        True
+
+    Within the with block, your insertions take effect immediately, but
+    BloomFilter.batched() stores the Bloom filter to Memcache only once, when
+    the block exits.
+
     Remove all of the elements from the Bloom filter:
 
         >>> dilberts.clear()
     '''
 
+    __slots__ = (
+        'num_values',
+        'false_positives',
+        '_pending',
+        '_size',
+        '_num_hashes',
+        '_num_blocks',
+        '_bit_array',
+        '_num_bits_set',
+        '_cas',
+        '_cas_stale',
+        '_offsets_cache',
+    )
+
     _RANDOM_KEY_PREFIX = 'tmp:bloom:'
 
+    # We partition our bit array into blocks, each the size of a 64-byte CPU
+    # cache line, and we set/check all k of a value's bits within one block.
+    # That way, each insertion/lookup touches only 1 cache line, rather than k
+    # cache lines scattered throughout the bit array.  We take a bit offset
+    # within a block from the top _BLOCK_SIZE.bit_length() - 1 bits of a
+    # 64-bit word.
+    _BLOCK_SIZE = 512
+    _BLOCK_SHIFT = 64 - (_BLOCK_SIZE.bit_length() - 1)
+
+    # We remember the bit offsets of up to this many of our elements, so that
+    # we don't have to rehash elements that we insert/look up over and over.
+    _OFFSETS_CACHE_SIZE = 1024
+
+    # Sizing our bit array takes a numerical search (see _min_num_blocks()),
+    # so remember its result for each (n, p) that we've seen.  There are only
+    # ever a handful of those.
+    _NUM_BLOCKS_CACHE = {}
+
+    # contains_in_many(refresh=True) reloads Bloom filters from Memcache in at
+    # most this many threads at once.
+    _MAX_REFRESH_THREADS = 8
+
     def __init__(self, iterable=frozenset(), memcache=None, key=None,
                  num_values=1000, false_positives=0.001):
         super(BloomFilter, self).__init__(memcache=memcache, key=key)
         self.num_values = num_values
         self.false_positives = false_positives
-        self._load_bit_array()
+        self._pending = None
+        self._offsets_cache = {}
+
+        # Compute m and k once, up front, as we need them to hash every single
+        # element that we insert/look up.  See size() and num_hashes().
+        self._size = -num_values * math.log(false_positives) / math.log(2)**2
+        self._size = int(math.ceil(self._size))
+        self._size = (self._size + 7) & ~7
+        self._num_hashes = float(self._size) / num_values * math.log(2)
+        self._num_hashes = max(1, int(math.ceil(self._num_hashes)))
+        sizing = num_values, false_positives
+        try:
+            self._num_blocks = self._NUM_BLOCKS_CACHE[sizing]
+        except KeyError:
+            self._num_blocks = self._min_num_blocks()
+            self._NUM_BLOCKS_CACHE[sizing] = self._num_blocks
+
+        self._load_bit_array(cas=False)
         self.update(iterable)
 
     def __del__(self):  # pragma: no cover
@@ -121,16 +200,14 @@ class BloomFilter(Base):
         that you expect to insert (n) and your acceptable false positive
         probability (p).
 
+        Note that this is m for a classic Bloom filter.  We confine each
+        value's bits to one block of our bit array, so our bit array is a bit
+        bigger than m.  See _min_num_blocks().
+
         More about the formula that this method implements:
             https://en.wikipedia.org/wiki/Bloom_filter#Optimal_number_of_hash_functions
         '''
-        try:
-            return self._size
-        except AttributeError:
-            self._size = -self.num_values * math.log(self.false_positives) / math.log(2)**2
-            self._size = int(math.ceil(self._size))
-            self._size = self._size + (8 - self._size % 8) % 8
-            return self.size()
+        return self._size
 
     def num_hashes(self):
         '''The number of hash functions (k) given m and n, minimizing p.
@@ -144,12 +221,66 @@ class BloomFilter(Base):
         More about the formula that this method implements:
             https://en.wikipedia.org/wiki/Bloom_filter#Optimal_number_of_hash_functions
         '''
-        try:
-            return self._num_hashes
-        except AttributeError:
-            self._num_hashes = self.size() / self.num_values * math.log(2)
-            self._num_hashes = int(math.ceil(self._num_hashes))
-            return self.num_hashes()
+        return self._num_hashes
+
+    def _min_num_blocks(self):
+        '''The fewest blocks that keep our false positive probability <= p.
+
+        Some blocks hold more than their share of values, and the extra false
+        positives from those crowded blocks outweigh the savings from the
+        emptier ones.  So a blocked Bloom filter with m bits has a higher false
+        positive probability than a classic Bloom filter with m bits.  Start
+        from m bits' worth of blocks, then grow (with a binary search) to the
+        fewest blocks that meet p.
+        '''
+        false_positives = self.false_positives
+        low = max(1, int(math.ceil(float(self._size) / self._BLOCK_SIZE)))
+        high = low
+        while self._blocked_false_positives(high) > false_positives:
+            low, high = high + 1, high * 2
+        while low < high:
+            middle = (low + high) // 2
+            if self._blocked_false_positives(middle) > false_positives:
+                low = middle + 1
+            else:
+                high = middle
+        return high
+
+    def _blocked_false_positives(self, num_blocks):
+        '''The false positive probability given n, k, and a number of blocks.
+
+        The number of values that land in a given block is (approximately)
+        Poisson distributed with a mean of n / blocks, and a block holding i
+        values acts like a classic Bloom filter with 512 bits, i values, and k
+        hash functions.  So we weight each block load's false positive
+        probability by the probability of that load (Putze et al.).
+
+        Within a block, a lookup is a false positive with probability
+        E[(X / 512)**k], where X is the number of bits set.  The classic
+        formula approximates that with (E[X] / 512)**k, which underestimates it
+        with only 512 bits and a large k.  So we add the second order term in
+        the variance of X.
+
+        More about the false positive probability of blocked Bloom filters:
+            http://algo2.iti.kit.edu/documents/cacheefficientbloomfilters-jea.pdf
+        '''
+        num_hashes, block_size = self._num_hashes, float(self._BLOCK_SIZE)
+        mean_load = float(self.num_values) / num_blocks
+        max_load = int(mean_load + 10 * math.sqrt(mean_load) + 20)
+        probability, false_positives = math.exp(-mean_load), 0.0
+        for load in xrange(1, max_load + 1):
+            probability *= mean_load / load
+            num_bits = load * num_hashes
+            unset1 = (1 - 1 / block_size)**num_bits
+            unset2 = (1 - 2 / block_size)**num_bits
+            bits_set = block_size * (1 - unset1)
+            variance = block_size * unset1 * (1 - block_size * unset1)
+            variance += block_size * (block_size - 1) * unset2
+            correction = num_hashes * (num_hashes - 1) / 2.0
+            correction = 1 + correction * variance / bits_set**2
+            block_false_positives = (bits_set / block_size)**num_hashes
+            false_positives += probability * block_false_positives * correction
+        return false_positives
 
     def _bit_offsets(self, value):
         '''The bit offsets to set/check in this Bloom filter for a given value.
@@ -164,50 +295,133 @@ class BloomFilter(Base):
 
         Now let's look at a few examples:
 
-            >>> tuple(dilberts._bit_offsets('rajiv'))
-            (17L, 271L, 669L, 242L, 166L, 4L, 536L)
-            >>> tuple(dilberts._bit_offsets('raj'))
-            (521L, 491L, 440L, 871L, 938L, 682L, 455L)
-            >>> tuple(dilberts._bit_offsets('dan'))
-            (61L, 854L, 730L, 730L, 475L, 364L, 850L)
+            >>> map(int, dilberts._bit_offsets('rajiv'))
+            [553, 990, 710, 857, 880, 733, 839]
+            >>> map(int, dilberts._bit_offsets('raj'))
+            [524, 1015, 638, 898, 956, 631, 1017]
+            >>> map(int, dilberts._bit_offsets('dan'))
+            [154, 497, 276, 243, 188, 120, 262]
 
         Thus, if we want to insert the value 'rajiv' into our Bloom filter,
-        then we must set bits 17, 271, 669, 242, 166, 4, and 536 all to 1.  If
-        any/all of them are already 1, no problems.
+        then we must set bits 553, 990, 710, 857, 880, 733, and 839 all to 1.
+        If any/all of them are already 1, no problems.
 
         Similarly, if we want to check to see if the value 'rajiv' is in our
-        Bloom filter, then we must check to see if the bits 17, 271, 669, 242,
-        166, 4, and 536 are all set to 1.  If even one of those bits is set to
-        0, then the value 'rajiv' must never have been inserted into our Bloom
-        filter.  But if all of those bits are set to 1, then the value 'rajiv'
-        was *probably* inserted into our Bloom filter.
+        Bloom filter, then we must check to see if the bits 553, 990, 710, 857,
+        880, 733, and 839 are all set to 1.  If even one of those bits is set
+        to 0, then the value 'rajiv' must never have been inserted into our
+        Bloom filter.  But if all of those bits are set to 1, then the value
+        'rajiv' was *probably* inserted into our Bloom filter.
+
+        Rather than run our hash function k times with k different seeds, we
+        run it once to get two 64-bit hashes (h1 and h2).  We use the high 32
+        bits of h1 to pick a block, then derive the k bit offsets within that
+        block from a pseudorandom sequence seeded with h1 and h2.  Confining a
+        value's bits to one block increases our false positive probability,
+        which is why we size our bit array for blocks.  See _min_num_blocks().
+
+        More about deriving k hashes from 2:
+            https://www.eecs.harvard.edu/~michaelm/postscripts/rsa2008.pdf
+
+        More about blocked Bloom filters:
+            http://algo2.iti.kit.edu/documents/cacheefficientbloomfilters-jea.pdf
         '''
-        encoded_value = json.dumps(value, sort_keys=True)
-        for seed in xrange(self.num_hashes()):
-            yield mmh3.hash(encoded_value, seed=seed) % self.size()
+        return self._hash_bit_offsets(*self._hashes(value))
 
-    def _load_bit_array(self):
-        bit_string, self._cas = self.memcache.gets(self.key)
+    @staticmethod
+    def _encode(value):
+        '''Encode a value as a byte string for us to hash.
+
+        Strings are by far the most common elements, so we hash their UTF-8
+        bytes as is, rather than pay for a trip through the JSON encoder.
+        Everything else gets dumped as JSON.  Note that this means that a
+        string can collide with the JSON for another type (for example, '1'
+        with 1), which can produce false positives but never false negatives.
+        '''
+        type_ = type(value)
+        if type_ is str:
+            return value
+        elif type_ is unicode:
+            return value.encode('utf-8')
+        else:
+            return json.dumps(value, sort_keys=True)
+
+    @staticmethod
+    def _hash(encoded_value):
+        'Hash an encoded value once, returning two 64-bit hashes (h1 and h2).'
+        return _HASH_HALVES.unpack(mmh3.hash_bytes(encoded_value))
+
+    @classmethod
+    def _hashes(cls, value):
+        'Encode and hash a value, returning two 64-bit hashes (h1 and h2).'
+        return cls._hash(cls._encode(value))
+
+    def _hash_bit_offsets(self, hash1, hash2):
+        'The bit offsets to set/check in this Bloom filter for h1 and h2.'
+        # Map the high 32 bits of h1 onto [0, num_blocks) with a multiply and a
+        # shift rather than with a (much slower) modulo.
+        block = ((hash1 >> 32) * self._num_blocks) >> 32
+        block_offset = block * self._BLOCK_SIZE
+        block_shift = self._BLOCK_SHIFT
+
+        # Step a 64-bit LCG seeded with h1, with an odd increment from h2, and
+        # take our k offsets within the block from its top bits.  Every bit of
+        # h1 and h2 feeds every offset, so values that share a block don't
+        # share whole sets of offsets.
+        state, increment = hash1, hash2 | 1
+        for _ in xrange(self._num_hashes):
+            state = (state * _LCG_MULTIPLIER + increment) & _LCG_MASK
+            yield block_offset + (state >> block_shift)
+
+    def _num_bits(self):
+        return self._num_blocks * self._BLOCK_SIZE
+
+    def _load_bit_array(self, cas=True):
+        if cas:
+            bit_string, self._cas = self.memcache.gets(self.key)
+        else:
+            # Plain reads don't need a CAS token, so don't make Memcache issue
+            # one.  Mark our token as stale so that we fetch it right before
+            # our first write.
+            bit_string, self._cas = self.memcache.get(self.key), None
+        self._cas_stale = not cas
+        if bit_string is not None and len(bit_string) * 8 != self._num_bits():
+            # Memcache holds a bit array of some other size (for example,
+            # stored by an older version of BloomFilter, before we laid out our
+            # bits in blocks).  Our bit offsets don't line up with its bits, so
+            # start over rather than read past its end.
+            bit_string, self._cas = None, None
         if bit_string is None:
-            self._bit_array = bitarray('0' * self.size())
+            self._bit_array = bitarray(self._num_bits())
+            self._bit_array.setall(0)
+            self._num_bits_set = 0
             self._store_bit_array()
         else:
             self._bit_array = bitarray()
             self._bit_array.frombytes(bit_string)
+            self._num_bits_set = self._bit_array.count()
 
     def _store_bit_array(self):
         bit_string = self._bit_array.tobytes()
         if self._cas is None:
-            self.memcache.set(self.key, bit_string)
+            # Wait for Memcache to acknowledge our write; we no longer read our
+            # bit array right back, so nothing else orders it before readers.
+            self.memcache.set(self.key, bit_string, noreply=False)
         else:
             if not self.memcache.cas(self.key, bit_string, self._cas):
                 raise CheckAndSetError(memcache=self.memcache, key=self.key)
-        self._load_bit_array()
+
+        # Memcache has just issued a new CAS token for our write.  Rather than
+        # fetch our entire bit array right back just to learn that token, mark
+        # our token as stale and fetch it lazily, right before our next write.
+        self._cas_stale = True
 
     def _retry_check_and_set(num_tries=3):
         def decorator(func):
             @functools.wraps(func)
             def wrapper(self, *args, **kwargs):
+                if self._cas_stale:
+                    self._load_bit_array()
                 for try_num in xrange(num_tries):   # pragma: no cover
                     try:
                         return func(self, *args, **kwargs)
@@ -228,9 +442,8 @@ class BloomFilter(Base):
 
         Your element can be of any type that can be dumped as JSON.
         '''
-        self.update({value})
+        self._insert({self._encode(value)})
 
-    @_retry_check_and_set()
     def update(self, *iterables):
         '''Populate a Bloom filter with the elements in iterables.  O(n * k)
 
@@ -240,13 +453,98 @@ class BloomFilter(Base):
 
         Your elements can be of any type that can be dumped as JSON.
         '''
-        bit_offsets = set()
-        for value in itertools.chain(*iterables):
-            bit_offsets.update(self._bit_offsets(value))
+        # Encode all of our elements up front so that we can dedupe them, then
+        # hash each distinct element and set its bits exactly once.
+        encode, values = self._encode, itertools.chain(*iterables)
+        self._insert({encode(value) for value in values})
+
+    def _insert(self, encoded_values):
+        if not encoded_values:
+            # Nothing to insert, so don't fetch a CAS token and rewrite our
+            # unchanged bit array.
+            return
+        bit_offsets = self._encoded_bit_offsets(encoded_values)
+        if self._pending is None:
+            self._merge_bit_offsets(bit_offsets)
+        else:
+            self._set_bit_offsets(bit_offsets)
+            pending = self._pending
+            for bit_offset in bit_offsets:
+                pending[bit_offset] = 1
+
+    def _encoded_bit_offsets(self, encoded_values):
+        # Collect all of our elements' bit offsets up front, so that we hash
+        # our elements just once, even if we lose a check-and-set race and
+        # have to set their bits again in a fresh bit array.
+        bit_offsets = []
+        cached_bit_offsets = self._offsets_cache.get
+        for encoded_value in encoded_values:
+            offsets = cached_bit_offsets(encoded_value)
+            if offsets is None:
+                hashes = self._hash(encoded_value)
+                offsets = tuple(self._hash_bit_offsets(*hashes))
+                self._cache_offsets(encoded_value, offsets)
+            bit_offsets.extend(offsets)
+        return bit_offsets
+
+    def _cache_offsets(self, encoded_value, bit_offsets):
+        # Rather than track which of our cached elements we used least
+        # recently, just start over whenever our cache fills up.
+        if len(self._offsets_cache) >= self._OFFSETS_CACHE_SIZE:
+            self._offsets_cache.clear()
+        self._offsets_cache[encoded_value] = bit_offsets
+
+    @_retry_check_and_set()
+    def _merge_bit_offsets(self, bit_offsets):
+        self._set_bit_offsets(bit_offsets)
+        self._store_bit_array()
+
+    def _set_bit_offsets(self, bit_offsets):
+        # Set our bits one at a time, and keep our running count of bits set
+        # up to date as we go, so that an insertion costs O(k) rather than
+        # O(m).
+        bit_array, num_bits_set = self._bit_array, self._num_bits_set
         for bit_offset in bit_offsets:
-            self._bit_array[bit_offset] = 1
+            if not bit_array[bit_offset]:
+                bit_array[bit_offset] = 1
+                num_bits_set += 1
+        self._num_bits_set = num_bits_set
+
+    @_retry_check_and_set()
+    def _merge_mask(self, mask):
+        # We've batched up our insertions in a mask of the bits that they set.
+        # By now, we may have reloaded our bit array from Memcache (to fetch a
+        # fresh CAS token, or after losing a check-and-set race), so OR our
+        # mask into it in one C-level pass and recount our bits.
+        self._set_mask(mask)
         self._store_bit_array()
 
+    def _set_mask(self, mask):
+        self._bit_array |= mask
+        self._num_bits_set = self._bit_array.count()
+
+    @contextlib.contextmanager
+    def batched(self):
+        '''Batch up insertions, then store this Bloom filter to Memcache once.
+
+        Within a with bf.batched(): block, add() and update() set this Bloom
+        filter's bits right away (so membership tests and len() see your
+        insertions), but they don't store this Bloom filter to Memcache.  When
+        the block exits, we store this Bloom filter to Memcache just once.
+        '''
+        if self._pending is not None:
+            # We're already batching up insertions in an outer with block.
+            yield self
+        else:
+            self._pending = bitarray(len(self._bit_array))
+            self._pending.setall(0)
+            try:
+                yield self
+            finally:
+                pending, self._pending = self._pending, None
+                if pending.any():
+                    self._merge_mask(pending)
+
     def __contains__(self, value):
         '''bf.__contains__(element) <==> element in bf.  O(k)
 
@@ -256,8 +554,91 @@ class BloomFilter(Base):
 
         Your element can be of any type that can be dumped as JSON.
         '''
-        bit_offsets = set(self._bit_offsets(value))
-        return all(self._bit_array[bit_offset] for bit_offset in bit_offsets)
+        return self._contains_encoded(self._encode(value))
+
+    def _contains_encoded(self, encoded_value):
+        bit_array = self._bit_array
+        bit_offsets = self._offsets_cache.get(encoded_value)
+        if bit_offsets is None:
+            # We haven't cached this element's bit offsets, so compute them one
+            # at a time and bail on the first 0 bit.  If we don't bail, then
+            # we've computed all of them, so cache them.
+            bit_offsets = []
+            hashes = self._hash(encoded_value)
+            for bit_offset in self._hash_bit_offsets(*hashes):
+                if not bit_array[bit_offset]:
+                    return False
+                bit_offsets.append(bit_offset)
+            self._cache_offsets(encoded_value, tuple(bit_offsets))
+            return True
+        for bit_offset in bit_offsets:
+            if not bit_array[bit_offset]:
+                return False
+        return True
+
+    def _contains_hashes(self, hash1, hash2):
+        # Check each bit as soon as we've computed its offset, so that we can
+        # bail on the first 0 bit without computing the remaining offsets.
+        for bit_offset in self._hash_bit_offsets(hash1, hash2):
+            if not self._bit_array[bit_offset]:
+                return False
+        return True
+
+    def contains_many(self, values):
+        '''Test each element in values for membership in this Bloom filter.
+
+        This returns a list of bools, in the same order as values.  It's
+        equivalent to [value in bf for value in values], only faster, as it
+        looks up this Bloom filter's hash and bit test methods just once.
+
+        Your elements can be of any type that can be dumped as JSON.
+        '''
+        encode, contains_encoded = self._encode, self._contains_encoded
+        return [contains_encoded(encode(value)) for value in values]
+
+    @classmethod
+    def contains_in_many(cls, filters, value, refresh=False):
+        '''Return the Bloom filters in filters that contain value.  O(n * k)
+
+        Here, n is the number of Bloom filters in filters, and k is the number
+        of times to run our hash functions on value.
+
+        This is equivalent to [bf for bf in filters if value in bf], except
+        that it hashes value only once (rather than once per Bloom filter).
+
+        If refresh is True, then first reload each Bloom filter from Memcache,
+        in up to 8 parallel threads, so that your lookups see other clients'
+        writes without waiting on all of the reloads one after another.  A
+        Memcache client can only send one command at a time, so we reload Bloom
+        filters that share a Memcache client one after another, in the same
+        thread.
+
+        Your element can be of any type that can be dumped as JSON.
+        '''
+        filters = tuple(filters)
+        if refresh and filters:
+            groups = collections.OrderedDict()
+            for bf in filters:
+                groups.setdefault(id(bf.memcache), []).append(bf)
+            pool = ThreadPool(min(len(groups), cls._MAX_REFRESH_THREADS))
+            try:
+                pool.map(cls._refresh_all, groups.values())
+            finally:
+                pool.close()
+                pool.join()
+        hash1, hash2 = cls._hashes(value)
+        return [bf for bf in filters if bf._contains_hashes(hash1, hash2)]
+
+    @staticmethod
+    def _refresh_all(filters):
+        for bf in filters:
+            bf._refresh()
+
+    def _refresh(self):
+        self._load_bit_array(cas=False)
+        # Don't lose the insertions that we've batched up but not yet stored.
+        if self._pending is not None:
+            self._set_mask(self._pending)
 
     @_retry_check_and_set()
     def clear(self):
@@ -267,13 +648,17 @@ class BloomFilter(Base):
         Bloom filter.
         '''
         self._bit_array.setall(0)
+        self._num_bits_set = 0
+        if self._pending is not None:
+            self._pending.setall(0)
         self._store_bit_array()
 
     def __len__(self):
-        '''Return the approximate the number of elements in a BloomFilter.  O(m)
+        '''Return the approximate the number of elements in a BloomFilter.  O(1)
 
-        Here, m is the size in bits of the underlying string representing this
-        Bloom filter.
+        We keep a running count of the number of bits set in the underlying
+        string representing this Bloom filter, so we don't have to count them
+        all up on every call.
 
         Please note that this method returns an approximation, not an exact
         value.  So please don't rely on it for anything important like
@@ -282,9 +667,14 @@ class BloomFilter(Base):
         More about the formula that this method implements:
             https://en.wikipedia.org/wiki/Bloom_filter#Approximating_the_number_of_items_in_a_Bloom_filter
         '''
-        num_bits_set = self._bit_array.count()
-        len_ = -float(self.size()) / self.num_hashes() * math.log(1 - float(num_bits_set) / self.size())
-        return int(math.floor(len_))
+        num_bits = float(len(self._bit_array))
+        num_bits_set = self._num_bits_set
+        len_ = -num_bits / self.num_hashes() * math.log(1 - num_bits_set / num_bits)
+
+        # Round (rather than floor) our estimate.  All of a value's bits live
+        # in the same block, so two values are more likely to share a bit, and
+        # a single shared bit would otherwise knock our estimate down by 1.
+        return int(round(len_))
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -7,7 +7,16 @@
 
 
 import collections
-import json
+import contextlib
+import itertools
+
+try:
+    # ujson is a drop-in, C-accelerated replacement for the stdlib's json.
+    # We (de)serialize our entire deque on every load/store, so use ujson if
+    # it's installed.
+    import ujson as json
+except ImportError:  # pragma: no cover
+    import json
 
 from .base import Base, run_doctests
 
@@ -31,9 +40,24 @@ class RecentlyConsumed(Base):
     instances/accesses.  A good choice for such a lock is .memlock.MemLock.
     '''
 
+    __slots__ = (
+        '_maxlen',
+        '_deque',
+        '_set',
+        '_appendable',
+        '_pending',
+        '_rewrite',
+    )
+
     _RANDOM_KEY_PREFIX = 'tmp:consumed:'
     _MAXLEN = 1000
 
+    # We persist our values as a version byte followed by our UTF-8 encoded
+    # values joined by newlines.  Legacy JSON lists start with '[', so we can
+    # tell the two formats apart.
+    _FORMAT_VERSION = '\x01'
+    _SEPARATOR = '\n'
+
     # If _NOREPLY is False, then we wait for each Memcache command to complete
     # before moving on to the next line of code.  _NOREPLY should be False when
     # running our unit tests (to make our tests run deterministically), but
@@ -43,7 +67,16 @@ class RecentlyConsumed(Base):
     def __init__(self, memcache=None, key=None, maxlen=_MAXLEN):
         super(RecentlyConsumed, self).__init__(memcache=memcache, key=key)
         self._maxlen = maxlen
-        self._load_from_memcache()
+
+        # Don't hit Memcache until we first need our values.  See
+        # _ensure_loaded().  self._appendable tracks whether our Memcache
+        # payload is in a format that we can append to in place.
+        self._deque, self._set, self._appendable = None, None, False
+
+        # While we're batching up writes (see batched()), self._pending holds
+        # the values that we've appended since our last write, and
+        # self._rewrite tracks whether we have to rewrite all of our values.
+        self._pending, self._rewrite = None, False
 
     @property
     def maxlen(self):
@@ -57,68 +90,186 @@ class RecentlyConsumed(Base):
 
     def _load_from_memcache(self):
         string = self.memcache.get(self.key, default='[]')
-        list_ = json.loads(string)
+        list_ = self._unpack(string)
         if self.maxlen is not None and len(list_) > self.maxlen:
-            message = 'persistent {} beyond its maximum size'
-            message = message.format(self.__class__.__name__)
-            raise IndexError(message)
+            if string[:1] != self._FORMAT_VERSION:
+                message = 'persistent {} beyond its maximum size'
+                message = message.format(self.__class__.__name__)
+                raise IndexError(message)
+            # Two instances can race to append to our values in Memcache, and
+            # push them past maxlen.  Keep just our newest values, as though
+            # we'd appended them and pruned the rest ourselves.
+            list_ = list_[len(list_) - self.maxlen:]
         self._deque = collections.deque(list_)
         self._set = set(list_)
+        self._appendable = string[:1] == self._FORMAT_VERSION
+
+    def _ensure_loaded(self):
+        if self._set is None:
+            self._load_from_memcache()
 
     def _store_to_memcache(self):
         if self._set:
-            list_ = list(self._deque)
-            string = json.dumps(list_)
+            string = self._pack(self._deque)
             self.memcache.set(self.key, string, noreply=self._NOREPLY)
+            self._appendable = string[:1] == self._FORMAT_VERSION
         else:
             self.memcache.delete(self.key, noreply=self._NOREPLY)
+            self._appendable = False
+
+    def _write(self, new_values, rewrite):
+        if self._pending is not None:
+            self._pending.extend(new_values)
+            self._rewrite = self._rewrite or rewrite
+        elif rewrite:
+            self._store_to_memcache()
+        else:
+            self._append_to_memcache(new_values)
+
+    def _append_to_memcache(self, values):
+        # If Memcache already holds our values framed with newlines, then send
+        # Memcache just our new values to tack on to the end, rather than
+        # rewrite all of our values.
+        #
+        # Always wait for Memcache's reply to an append, even when _NOREPLY is
+        # True.  If Memcache has evicted our values, then the append fails,
+        # and we have to rewrite all of our values.  With noreply, we'd never
+        # find out, and we'd lose all of our values.
+        if self._appendable and not any(self._SEPARATOR in v for v in values):
+            values = (value.encode('utf-8') for value in values)
+            string = self._SEPARATOR + self._SEPARATOR.join(values)
+            if self.memcache.append(self.key, string, noreply=False):
+                return
+        self._store_to_memcache()
+
+    @classmethod
+    def _pack(cls, values):
+        # Our values are typically short fullnames like u't3_abcdef', so
+        # framing them with newlines is much cheaper than dumping them as JSON.
+        # But fall back to JSON for any value that contains our separator.
+        if any(cls._SEPARATOR in value for value in values):
+            return json.dumps(list(values))
+        values = (value.encode('utf-8') for value in values)
+        return cls._FORMAT_VERSION + cls._SEPARATOR.join(values)
+
+    @classmethod
+    def _unpack(cls, string):
+        if string[:1] == cls._FORMAT_VERSION:
+            return string[1:].decode('utf-8').split(cls._SEPARATOR)
+        return json.loads(string)
 
     def _prune_to_maxlen(self):
-        while self.maxlen is not None and len(self) > self.maxlen:
-            value = self._deque.popleft()
-            self._set.remove(value)
+        if self.maxlen is None:
+            return False
+        num_extra = len(self) - self.maxlen
+        popleft, remove = self._deque.popleft, self._set.remove
+        for _ in xrange(num_extra):
+            remove(popleft())
+        return num_extra > 0
 
     def __len__(self):
         'Return the number of items in the RecentlyConsumed.'
+        self._ensure_loaded()
         return len(self._set)
 
     def __contains__(self, value):
         'rc.__contains__(element) <==> element in rc.'
+        self._ensure_loaded()
         return unicode(value) in self._set
 
+    def contains_many(self, values):
+        '''Test each element in values for membership in the RecentlyConsumed.
+
+        This returns a list of bools, in the same order as values.  It's
+        equivalent to [value in rc for value in values], only faster.
+        '''
+        self._ensure_loaded()
+        set_ = self._set
+        return [unicode(value) in set_ for value in values]
+
     def append(self, value):
         'Add an element to the right side of the RecentlyConsumed.'
+        self._ensure_loaded()
         value = unicode(value)
-        if value not in self:
+        if value not in self._set:
             self._deque.append(value)
             self._set.add(value)
-            self._prune_to_maxlen()
-            self._store_to_memcache()
+            self._write((value,), self._prune_to_maxlen())
 
     def extend(self, values):
         'Extend a RecentlyConsumed by appending elements from the iterable.'
-        values = tuple(unicode(value) for value in values if value not in self)
-        if values:
-            self._deque.extend(values)
-            self._set.update(values)
-            self._prune_to_maxlen()
-            self._store_to_memcache()
+        self._ensure_loaded()
+        # Test against our set directly (rather than through __contains__()),
+        # and skip duplicates within values too, keeping their first order.
+        set_, new_values, new_set = self._set, [], set()
+        for value in values:
+            value = unicode(value)
+            if value not in set_ and value not in new_set:
+                new_values.append(value)
+                new_set.add(value)
+        if new_values:
+            self._deque.extend(new_values)
+            set_ |= new_set
+            self._write(new_values, self._prune_to_maxlen())
+
+    def update(self, *iterables):
+        'Extend a RecentlyConsumed by appending elements from the iterables.'
+        self.extend(itertools.chain(*iterables))
+
+    @contextlib.contextmanager
+    def batched(self):
+        '''Batch up changes, then write the RecentlyConsumed to Memcache once.
+
+        Within a with rc.batched(): block, append(), extend(), update(), and
+        clear() change the RecentlyConsumed right away, but they don't write it
+        to Memcache.  When the block exits, we write it to Memcache just once.
+        '''
+        if self._pending is not None:
+            # We're already batching up changes in an outer with block.
+            yield self
+        else:
+            self._pending, self._rewrite = [], False
+            try:
+                yield self
+            finally:
+                self.flush()
+                self._pending = None
+
+    def flush(self):
+        '''Write the changes batched up within batched() to Memcache now.
+
+        Outside of a with rc.batched(): block, we write every change to
+        Memcache right away, so there's nothing to flush.
+        '''
+        if self._pending is not None:
+            pending, self._pending = self._pending, []
+            rewrite, self._rewrite = self._rewrite, False
+            if rewrite:
+                self._store_to_memcache()
+            elif pending:
+                self._append_to_memcache(pending)
 
     def clear(self):
         'Remove all elements from the RecentlyConsumed.'
-        self._deque.clear()
-        self._set.clear()
-        self._store_to_memcache()
+        if self._set is not None and not self._set:
+            # We've loaded our values and we're already empty.
+            return
+        # No need to load our values from Memcache just to throw them away.
+        self._deque, self._set = collections.deque(), set()
+        self._write((), True)
 
     def __repr__(self):
         'Return the string representation of the RecentlyConsumed data struct.'
-        repr = self.__class__.__name__ + '('
-        repr += str(list(self._deque))
-        repr += ', key={}'.format(self.key)
+        self._ensure_loaded()
+        maxlen = ''
         if self.maxlen is not None:
-            repr += ', ' + 'maxlen={}'.format(self.maxlen)
-        repr += ')'
-        return repr
+            maxlen = ', maxlen={}'.format(self.maxlen)
+        return '{}({!r}, key={}{})'.format(
+            self.__class__.__name__,
+            list(self._deque),
+            self.key,
+            maxlen,
+        )
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -41,10 +41,17 @@ class ContextTimer(object):
         [True, True]
     '''
 
+    __slots__ = ('_started', '_stopped', '_elapsed')
+
+    # Tell time through this, so that our tests can swap in a fake clock
+    # rather than actually sleep.
+    _timer = staticmethod(timeit.default_timer)
+
     def __init__(self):
         super(ContextTimer, self).__init__()
         self._started = None
         self._stopped = None
+        self._elapsed = None
 
     def __enter__(self):
         self.start()
@@ -59,21 +66,28 @@ class ContextTimer(object):
         elif self._started:
             raise RuntimeError('timer has already been started')
         else:
-            self._started = timeit.default_timer()
+            self._started = self._timer()
 
     def stop(self):
         if self._stopped:
             raise RuntimeError('timer has already been stopped')
         elif self._started:
-            self._stopped = timeit.default_timer()
+            self._stopped = self._timer()
+            # Our elapsed time won't change anymore, so compute it just once.
+            self._elapsed = self._round(self._stopped - self._started)
         else:
             raise RuntimeError("timer hasn't yet been started")
 
     def elapsed(self):
+        if self._elapsed is not None:
+            return self._elapsed
         try:
-            value = (self._stopped or timeit.default_timer()) - self._started
+            value = self._timer() - self._started
         except TypeError:
             raise RuntimeError("timer hasn't yet been started")
         else:
-            value = round(value * 1000) # rounded to the nearest millisecond
-            return value
+            return self._round(value)
+
+    @staticmethod
+    def _round(value):
+        return round(value * 1000) # rounded to the nearest millisecond
@@ -7,6 +7,8 @@
 
 
 class BloomFilterException(Exception):
+    __slots__ = ('memcache', 'key', 'retriable')
+
     def __init__(self, memcache=None, key=None, retriable=False):
         super(BloomFilterException, self).__init__()
         self.memcache = memcache
@@ -22,18 +24,16 @@ class BloomFilterException(Exception):
 
 
 class CheckAndSetError(BloomFilterException):
+    __slots__ = ()
+
     def __init__(self, memcache=None, key=None):
-        super(CheckAndSetError, self).__init__(
-            memcache=memcache,
-            key=key,
-            retriable=True,
-        )
+        # Pass our arguments positionally; we raise this on every lost
+        # check-and-set race, so keep raising it cheap.
+        super(CheckAndSetError, self).__init__(memcache, key, True)
 
 
 class ReleaseUnlockedLock(BloomFilterException):
+    __slots__ = ()
+
     def __init__(self, memcache=None, key=None):
-        super(ReleaseUnlockedLock, self).__init__(
-            memcache=memcache,
-            key=key,
-            retriable=False,
-        )
+        super(ReleaseUnlockedLock, self).__init__(memcache, key, False)
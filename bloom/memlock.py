@@ -8,9 +8,9 @@
 
 import random
 import time
+import timeit
 
 from .base import Base, run_doctests
-from .contexttimer import ContextTimer
 from .exceptions import ReleaseUnlockedLock
 
 
@@ -61,9 +61,22 @@ class MemLock(Base):
         [True, False]
     '''
 
+    __slots__ = ('auto_release_time', '_value', '_acquired_at')
+
     _RANDOM_KEY_PREFIX = 'tmp:memlock:'
     _AUTO_RELEASE_TIME = 1
-    _RETRY_DELAY = 0.2
+
+    # While we wait on a lock, we back off exponentially (with jitter) between
+    # attempts to acquire it, starting at _RETRY_DELAY and capped at
+    # _MAX_RETRY_DELAY seconds (or at a quarter of our auto release time, for
+    # short-lived locks, so that we don't oversleep a lock's expiration).
+    _RETRY_DELAY = 0.005
+    _MAX_RETRY_DELAY = 0.2
+
+    # Tell time and sleep through these, so that our tests can swap in a fake
+    # clock rather than actually wait for our locks to time out.
+    _timer = staticmethod(timeit.default_timer)
+    _sleep = staticmethod(time.sleep)
 
     def __init__(self, memcache=None, key=None,
                  auto_release_time=_AUTO_RELEASE_TIME):
@@ -80,23 +93,60 @@ class MemLock(Base):
         # holds the lock.
         self._value = self._random_key()
 
+        # Track when this MemLock instance acquired the lock (or None if it
+        # doesn't hold the lock), so that __repr__() doesn't have to ask
+        # Memcache.  See _held().
+        self._acquired_at = None
+
     def _memcache_add(self):
-        return self.memcache.add(
+        # Read our clock before we ask Memcache for the lock, so that we never
+        # believe that we hold the lock for longer than Memcache does.
+        acquired_at = self._timer()
+        added = self.memcache.add(
             self.key,
             self._value,
             expire=self.auto_release_time,
             noreply=False,
         )
+        if added:
+            self._acquired_at = acquired_at
+        return added
+
+    def _held(self):
+        '''Whether this MemLock instance believes that it holds the lock.
+
+        This is only our own belief, without a Memcache round trip.  Memcache
+        auto-releases our lock after auto_release_time, so we stop believing
+        that we hold it then.  But Memcache tracks expiration times with whole
+        second granularity, so it may release our lock a little sooner.  Ask
+        locked() for the authoritative answer.
+        '''
+        if self._acquired_at is None:
+            return False
+        if self.auto_release_time <= 0:
+            # An auto release time of 0 means that our lock never expires.
+            return True
+        elapsed = self._timer() - self._acquired_at
+        return elapsed < self.auto_release_time
 
     def acquire(self, blocking=True, timeout=-1):
         'Lock the lock.'
         if blocking:
-            with ContextTimer() as timer:
-                while timeout == -1 or timer.elapsed() / 1000 < timeout:
-                    if self._memcache_add():
-                        return True
-                    else:
-                        time.sleep(random.uniform(0, self._RETRY_DELAY))
+            # Compute our deadline once, up front, rather than measure our
+            # elapsed time in milliseconds on every attempt.
+            if timeout != -1:
+                deadline = self._timer() + timeout
+            max_delay = self._MAX_RETRY_DELAY
+            if self.auto_release_time > 0:
+                # An auto release time of 0 means that our lock never expires.
+                max_delay = min(max_delay, self.auto_release_time / 4.0)
+            delay = min(self._RETRY_DELAY, max_delay)
+            while timeout == -1 or self._timer() < deadline:
+                if self._memcache_add():
+                    return True
+                else:
+                    self._sleep(random.uniform(0, delay))
+                    delay = min(delay * 2, max_delay)
             return False
         elif timeout == -1:
             return self._memcache_add()
@@ -109,6 +159,7 @@ class MemLock(Base):
 
     def release(self):
         'Unlock the lock.'
+        self._acquired_at = None
         if not self.memcache.delete(self.key, noreply=False):
             raise ReleaseUnlockedLock(memcache=self.memcache, key=self.key)
 
@@ -125,7 +176,7 @@ class MemLock(Base):
         return '<{} key={} locked={}>'.format(
             self.__class__.__name__,
             self.key,
-            self.locked(),
+            self._held(),
         )
 
 
@@ -0,0 +1,23 @@
+#-----------------------------------------------------------------------------#
+#   fakes.py                                                                  #
+#                                                                             #
+#   Copyright (c) 2017-2018, Rajiv Bakulesh Shah, original author.            #
+#   All rights reserved.                                                      #
+#-----------------------------------------------------------------------------#
+'Fakes that our tests share.'
+
+
+class FakeClock(object):
+    'Clock that only moves forward when something sleeps.'
+
+    def __init__(self, now=0.0):
+        super(FakeClock, self).__init__()
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.sleeps.append(seconds)
@@ -9,11 +9,25 @@
 import math
 import random
 import string
+import threading
 import unittest
 
 from bloom import BloomFilter
 
 
+class CommandRecorder(object):
+    'Wrap a Memcache client, and record the commands that we send it.'
+
+    def __init__(self, memcache):
+        super(CommandRecorder, self).__init__()
+        self._memcache = memcache
+        self.commands = []
+
+    def __getattr__(self, name):
+        self.commands.append(name)
+        return getattr(self._memcache, name)
+
+
 class BloomFilterTests(unittest.TestCase):
     def test_init(self):
         dilberts = BloomFilter()
@@ -33,10 +47,30 @@ class BloomFilterTests(unittest.TestCase):
         assert 'eric' not in dilberts
         assert len(dilberts) == 2
 
+    def test_high_false_positives(self):
+        for false_positives in (0.7, 0.9):
+            dilberts = BloomFilter(
+                {'rajiv', 'raj'},
+                num_values=100,
+                false_positives=false_positives,
+            )
+            assert dilberts.num_hashes() == 1
+            assert 'rajiv' in dilberts
+            assert 'raj' in dilberts
+
+    def test_init_and_contains_only_get(self):
+        dilberts = BloomFilter({'rajiv'})
+        memcache = CommandRecorder(dilberts.memcache)
+        office_space = BloomFilter(memcache=memcache, key=dilberts.key)
+        office_space.update(())
+        assert 'rajiv' in office_space
+        assert 'raj' not in office_space
+        assert memcache.commands == ['get']
+
     def test_size_and_num_hashes(self):
         dilberts = BloomFilter(num_values=100, false_positives=0.1)
         assert dilberts.size() == 480
-        assert dilberts.num_hashes() == 3
+        assert dilberts.num_hashes() == 4
 
         dilberts = BloomFilter(num_values=100, false_positives=0.01)
         assert dilberts.size() == 960
@@ -44,7 +78,7 @@ class BloomFilterTests(unittest.TestCase):
 
         dilberts = BloomFilter(num_values=1000, false_positives=0.1)
         assert dilberts.size() == 4800
-        assert dilberts.num_hashes() == 3
+        assert dilberts.num_hashes() == 4
 
         dilberts = BloomFilter(num_values=1000, false_positives=0.01)
         assert dilberts.size() == 9592
@@ -156,6 +190,111 @@ class BloomFilterTests(unittest.TestCase):
         assert 'eric' not in dilberts
         assert len(dilberts) == 0
 
+    def test_num_bits_set(self):
+        'Ensure that our running count of bits set stays accurate'
+        dilberts = BloomFilter({'rajiv', 'raj'})
+        assert dilberts._num_bits_set == dilberts._bit_array.count()
+        dilberts.add('dan')
+        assert dilberts._num_bits_set == dilberts._bit_array.count()
+        dilberts.update({'dan', 'eric'}, {'jenny'})
+        assert dilberts._num_bits_set == dilberts._bit_array.count()
+        dilberts.clear()
+        assert dilberts._num_bits_set == dilberts._bit_array.count() == 0
+
+    def test_contains_many(self):
+        dilberts = BloomFilter({'rajiv', 'raj'})
+        assert dilberts.contains_many(('rajiv', 'dan', 'raj', 'eric')) == [
+            True,
+            False,
+            True,
+            False,
+        ]
+        assert dilberts.contains_many(()) == []
+
+    def test_contains_in_many(self):
+        dilberts = BloomFilter({'rajiv', 'raj'})
+        engineers = BloomFilter({'rajiv', 'dan'}, num_values=100)
+        managers = BloomFilter({'eric'}, false_positives=0.01)
+        filters = (dilberts, engineers, managers)
+        assert BloomFilter.contains_in_many(filters, 'rajiv') == [
+            dilberts,
+            engineers,
+        ]
+        assert BloomFilter.contains_in_many(filters, 'raj') == [dilberts]
+        assert BloomFilter.contains_in_many(filters, 'dan') == [engineers]
+        assert BloomFilter.contains_in_many(filters, 'eric') == [managers]
+        assert BloomFilter.contains_in_many(filters, 'jenny') == []
+        assert BloomFilter.contains_in_many((), 'rajiv') == []
+
+    def test_contains_in_many_with_refresh(self):
+        dilberts = BloomFilter({'rajiv', 'raj'})
+        engineers = BloomFilter({'rajiv', 'dan'}, num_values=100)
+        office_space = BloomFilter(key=dilberts.key)
+        office_space.add('eric')
+        with engineers.batched():
+            engineers.add('eric')
+            filters = (dilberts, engineers)
+            assert BloomFilter.contains_in_many(filters, 'eric') == [
+                engineers,
+            ]
+            assert BloomFilter.contains_in_many(
+                filters,
+                'eric',
+                refresh=True,
+            ) == [dilberts, engineers]
+            assert BloomFilter.contains_in_many((), 'eric', refresh=True) == []
+
+    def test_contains_in_many_with_refresh_joins_threads(self):
+        num_filters = BloomFilter._MAX_REFRESH_THREADS * 2 + 1
+        filters = [BloomFilter({'rajiv'}) for _ in xrange(num_filters)]
+        num_threads = threading.active_count()
+        assert BloomFilter.contains_in_many(
+            filters,
+            'rajiv',
+            refresh=True,
+        ) == filters
+        assert threading.active_count() == num_threads
+
+    def test_contains_in_many_with_refresh_sharing_a_client(self):
+        dilberts = BloomFilter({'rajiv'})
+        num_filters = BloomFilter._MAX_REFRESH_THREADS * 2
+        filters = [
+            BloomFilter({'rajiv'}, memcache=dilberts.memcache)
+            for _ in xrange(num_filters)
+        ]
+        for _ in xrange(10):
+            assert BloomFilter.contains_in_many(
+                filters,
+                'rajiv',
+                refresh=True,
+            ) == filters
+
+    def test_offsets_cache(self):
+        dilberts = BloomFilter({'rajiv', 'raj'})
+        assert 'rajiv' in dilberts
+        assert 'dan' not in dilberts
+        assert set(dilberts._offsets_cache) == {'rajiv', 'raj'}
+        cache_size = BloomFilter._OFFSETS_CACHE_SIZE
+        dilberts.update(str(number) for number in xrange(cache_size))
+        assert len(dilberts._offsets_cache) <= cache_size
+        assert 'rajiv' in dilberts
+        assert 'raj' in dilberts
+        assert 'dan' not in dilberts
+
+    def test_init_with_bit_array_of_another_size(self):
+        'Ensure that we start over on a bit array stored for another size'
+        dilberts = BloomFilter()
+        bit_string = '\xff' * (dilberts.size() // 8)
+        dilberts.memcache.set(dilberts.key, bit_string, noreply=False)
+        office_space = BloomFilter(key=dilberts.key)
+        assert 'rajiv' not in office_space
+        office_space.update({'rajiv', 'raj'})
+        assert 'rajiv' in office_space
+        assert 'raj' in office_space
+        assert 'dan' not in office_space
+        bit_string = office_space.memcache.get(office_space.key)
+        assert bit_string == office_space._bit_array.tobytes()
+
     def test_repr(self):
         dilberts = BloomFilter(key='dilberts')
         assert repr(dilberts) == '<BloomFilter key=dilberts>'
@@ -164,42 +303,46 @@ class BloomFilterTests(unittest.TestCase):
 class RecentlyConsumedSimulationTests(unittest.TestCase):
     "Simulate reddit's recently consumed problem to test our Bloom filter."
 
-    def setUp(self):
-        super(self.__class__, self).setUp()
+    ALPHABET36 = string.digits + string.ascii_lowercase
+
+    @classmethod
+    def setUpClass(cls):
+        # Our tests only read our fixtures, so build them (and store our Bloom
+        # filter to Memcache) once for all of our tests.
+        super(RecentlyConsumedSimulationTests, cls).setUpClass()
 
         # Construct a set of links that the user has seen.
-        self.seen_links = set()
-        while len(self.seen_links) < 100:
-            fullname = self.random_fullname()
-            self.seen_links.add(fullname)
+        cls.seen_links = set()
+        while len(cls.seen_links) < 100:
+            fullname = cls.random_fullname()
+            cls.seen_links.add(fullname)
 
         # Construct a set of links that the user hasn't seen.  Ensure that
         # there's no intersection between the seen set and the unseen set.
-        self.unseen_links = set()
-        while len(self.unseen_links) < 100:
-            fullname = self.random_fullname()
-            if fullname not in self.seen_links:
-                self.unseen_links.add(fullname)
+        cls.unseen_links = set()
+        while len(cls.unseen_links) < 100:
+            fullname = cls.random_fullname()
+            if fullname not in cls.seen_links:
+                cls.unseen_links.add(fullname)
 
         # Initialize the recently consumed Bloom filter on the seen set.
-        self.recently_consumed = BloomFilter(
+        cls.recently_consumed = BloomFilter(
             num_values=1000,
             false_positives=0.001,
             key='recently-consumed',
         )
-        self.recently_consumed.clear()
-        self.recently_consumed.update(self.seen_links)
+        cls.recently_consumed.clear()
+        cls.recently_consumed.update(cls.seen_links)
 
-    def tearDown(self):
-        self.recently_consumed.memcache.delete(self.recently_consumed.key)
-        super(self.__class__, self).tearDown()
+    @classmethod
+    def tearDownClass(cls):
+        cls.recently_consumed.memcache.delete(cls.recently_consumed.key)
+        super(RecentlyConsumedSimulationTests, cls).tearDownClass()
 
-    @staticmethod
-    def random_fullname(prefix='t3_', size=6):
-        alphabet36, id36 = string.digits + string.ascii_lowercase, []
-        for _ in xrange(size):
-            id36.append(random.choice(alphabet36))
-        return prefix + ''.join(id36)
+    @classmethod
+    def random_fullname(cls, prefix='t3_', size=6):
+        choice, alphabet36 = random.choice, cls.ALPHABET36
+        return prefix + ''.join(choice(alphabet36) for _ in xrange(size))
 
     @staticmethod
     def round(number, sig_digits=1):
@@ -219,15 +362,12 @@ class RecentlyConsumedSimulationTests(unittest.TestCase):
 
     def test_zero_false_negatives(self):
         'Ensure that we produce zero false negatives'
-        for seen_link in self.seen_links:
-            assert seen_link in self.recently_consumed
+        assert all(self.recently_consumed.contains_many(self.seen_links))
 
     def test_acceptable_false_positives(self):
         'Ensure that we produce false positives at an acceptable rate'
-        acceptable, actual = self.recently_consumed.false_positives, 0
-
-        for unseen_link in self.unseen_links:
-            actual += unseen_link in self.recently_consumed
+        acceptable = self.recently_consumed.false_positives
+        actual = sum(self.recently_consumed.contains_many(self.unseen_links))
         actual /= float(len(self.unseen_links))
         actual = self.round(actual, sig_digits=1)
 
@@ -235,6 +375,31 @@ class RecentlyConsumedSimulationTests(unittest.TestCase):
         assert actual <= acceptable, message
 
 
+class FalsePositiveRateTests(unittest.TestCase):
+    'Measure our false positive rate at capacity over a large sample.'
+
+    NUM_LOOKUPS = 50000
+
+    def _false_positive_rate(self, num_values, false_positives):
+        dilberts = BloomFilter(
+            num_values=num_values,
+            false_positives=false_positives,
+        )
+        dilberts.update('seen:{}'.format(num) for num in xrange(num_values))
+        unseen = ('unseen:{}'.format(num) for num in xrange(self.NUM_LOOKUPS))
+        return sum(dilberts.contains_many(unseen)) / float(self.NUM_LOOKUPS)
+
+    def test_false_positive_rate(self):
+        for num_values, false_positives in ((1000, 0.01), (10000, 0.001)):
+            actual = self._false_positive_rate(num_values, false_positives)
+            message = 'n: {}; p: {}; actual: {}'.format(
+                num_values,
+                false_positives,
+                actual,
+            )
+            assert actual <= false_positives, message
+
+
 class StoreBitArrayTests(unittest.TestCase):
     'Whenever we change a BloomFilter, ensure that we Memcache our changes.'
 
@@ -269,6 +434,35 @@ class StoreBitArrayTests(unittest.TestCase):
         office_space = BloomFilter(key='dilberts')
         assert office_space._bit_array == self.dilberts._bit_array
 
+    def test_batched_gets_stored_on_exit(self):
+        'When we batch up insertions, ensure we Memcache the bit array on exit'
+        with self.dilberts.batched():
+            self.dilberts.add('dan')
+            self.dilberts.update({'eric', 'jenny'})
+            assert 'dan' in self.dilberts
+            assert 'jenny' in self.dilberts
+            assert len(self.dilberts) == 5
+            office_space = BloomFilter(key='dilberts')
+            assert 'rajiv' in office_space
+            assert 'dan' not in office_space
+            assert 'jenny' not in office_space
+        office_space = BloomFilter(key='dilberts')
+        assert office_space._bit_array == self.dilberts._bit_array
+        assert 'dan' in office_space
+        assert 'jenny' in office_space
+
+    def test_clear_within_batched_gets_stored(self):
+        'When we clear() within a batch, ensure we drop batched insertions'
+        with self.dilberts.batched():
+            self.dilberts.add('dan')
+            self.dilberts.clear()
+            self.dilberts.add('eric')
+        office_space = BloomFilter(key='dilberts')
+        assert office_space._bit_array == self.dilberts._bit_array
+        assert 'rajiv' not in office_space
+        assert 'dan' not in office_space
+        assert 'eric' in office_space
+
 
 class CheckAndSetTests(unittest.TestCase):
     def setUp(self):
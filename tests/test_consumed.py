@@ -6,164 +6,278 @@
 #-----------------------------------------------------------------------------#
 
 
+import itertools
+import json
+import os
 import unittest
 
+from pymemcache.client.base import Client
+
 from bloom import RecentlyConsumed
 
 
+# Share one Memcache connection across all of our tests, rather than connect
+# to Memcache again for every single object that we construct.
+MEMCACHE = Client(
+    RecentlyConsumed._DEFAULT_MEMCACHE_SERVER,
+    connect_timeout=1,
+    timeout=1,
+    no_delay=True,
+)
+
+
 class RecentlyConsumedTests(unittest.TestCase):
-    def setUp(self):
-        super(RecentlyConsumedTests, self).setUp()
+    # Every fullname that our membership checks cover, so that we can test them
+    # all at once.  See _present().
+    UNIVERSE = tuple('t3_{}'.format(num) for num in range(1, 16))
+
+    @classmethod
+    def setUpClass(cls):
+        super(RecentlyConsumedTests, cls).setUpClass()
 
         # Wait for each Memcache command to complete before moving on to the
         # next line of code.  This makes our tests run deterministically.
         RecentlyConsumed._NOREPLY = False
 
-        self.consumed = RecentlyConsumed(key='consumed:rajiv', maxlen=10)
+        # Give each test its own Memcache key, so that our tests can't step on
+        # each other's toes, then delete all of our keys at once at the end.
+        # Our keys include our process ID too, so that test runs in parallel
+        # processes against the same Memcache can't collide.
+        cls.keys = set()
 
-    def tearDown(self):
-        self.consumed.clear()
+    @classmethod
+    def tearDownClass(cls):
+        MEMCACHE.delete_many(cls.keys, noreply=False)
         RecentlyConsumed._NOREPLY = True
-        super(RecentlyConsumedTests, self).tearDown()
+        super(RecentlyConsumedTests, cls).tearDownClass()
+
+    def setUp(self):
+        super(RecentlyConsumedTests, self).setUp()
+        self.key = 'consumed:rajiv:{}:{}'.format(
+            os.getpid(),
+            self._testMethodName,
+        )
+        self.keys.add(self.key)
+        self.consumed = self._consumed()
+
+    def _consumed(self, maxlen=10):
+        return RecentlyConsumed(memcache=MEMCACHE, key=self.key, maxlen=maxlen)
+
+    def _present(self):
+        'Return the set of fullnames in UNIVERSE that are in self.consumed.'
+        membership = self.consumed.contains_many(self.UNIVERSE)
+        return set(itertools.compress(self.UNIVERSE, membership))
 
     def test_maxlen_is_not_writable(self):
         with self.assertRaises(AttributeError):
             self.consumed.maxlen = 100
 
+    def test_not_appendable_before_loading(self):
+        assert self.consumed._appendable is False
+
     def test_memcached_list_does_not_exceed_maxlen(self):
-        self.consumed.extend(('t3_1', 't3_2', 't3_3', 't3_4', 't3_5', 't3_6'))
+        string = json.dumps(['t3_1', 't3_2', 't3_3', 't3_4', 't3_5', 't3_6'])
+        MEMCACHE.set(self.key, string, noreply=False)
+        consumed2 = self._consumed(maxlen=5)
         with self.assertRaises(IndexError):
-            RecentlyConsumed(key='consumed:rajiv', maxlen=5)
+            len(consumed2)
+
+    def test_racing_appends_beyond_maxlen(self):
+        'Ensure that two instances appending at once keep the newest values'
+        self.consumed.extend(('t3_1', 't3_2'))
+        consumed1 = self._consumed(maxlen=3)
+        consumed2 = self._consumed(maxlen=3)
+        assert len(consumed1) == len(consumed2) == 2
+        consumed1.append('t3_a')
+        consumed2.append('t3_b')
+        consumed3 = self._consumed(maxlen=3)
+        assert repr(consumed3) == (
+            "RecentlyConsumed([u't3_2', u't3_a', u't3_b'], "
+            "key={}, maxlen=3)".format(self.key)
+        )
+        consumed3.append('t3_c')
+        assert MEMCACHE.get(self.key) == '\x01t3_a\nt3_b\nt3_c'
 
     def test_typical_usage(self):
         assert len(self.consumed) == 0
-        assert 't3_1' not in self.consumed
-        assert 't3_2' not in self.consumed
-        assert 't3_3' not in self.consumed
-        assert 't3_4' not in self.consumed
-        assert 't3_5' not in self.consumed
+        assert self._present() == set()
 
         self.consumed.append('t3_1')
         assert len(self.consumed) == 1
-        assert 't3_1' in self.consumed
-        assert 't3_2' not in self.consumed
-        assert 't3_3' not in self.consumed
-        assert 't3_4' not in self.consumed
-        assert 't3_5' not in self.consumed
+        assert self._present() == {'t3_1'}
 
         self.consumed.extend(('t3_1', 't3_2', 't3_3'))
         assert len(self.consumed) == 3
-        assert 't3_1' in self.consumed
-        assert 't3_2' in self.consumed
-        assert 't3_3' in self.consumed
-        assert 't3_4' not in self.consumed
-        assert 't3_5' not in self.consumed
+        assert self._present() == {'t3_1', 't3_2', 't3_3'}
 
         self.consumed.append('t3_3')
         assert len(self.consumed) == 3
-        assert 't3_1' in self.consumed
-        assert 't3_2' in self.consumed
-        assert 't3_3' in self.consumed
-        assert 't3_4' not in self.consumed
-        assert 't3_5' not in self.consumed
+        assert self._present() == {'t3_1', 't3_2', 't3_3'}
 
         self.consumed.append('t3_4')
         assert len(self.consumed) == 4
-        assert 't3_1' in self.consumed
-        assert 't3_2' in self.consumed
-        assert 't3_3' in self.consumed
-        assert 't3_4' in self.consumed
-        assert 't3_5' not in self.consumed
+        assert self._present() == {'t3_1', 't3_2', 't3_3', 't3_4'}
 
         self.consumed.extend(('t3_3', 't3_4'))
         assert len(self.consumed) == 4
-        assert 't3_1' in self.consumed
-        assert 't3_2' in self.consumed
-        assert 't3_3' in self.consumed
-        assert 't3_4' in self.consumed
-        assert 't3_5' not in self.consumed
+        assert self._present() == {'t3_1', 't3_2', 't3_3', 't3_4'}
 
     def test_pruning_to_maxlen(self):
         self.consumed.extend(('t3_1', 't3_2', 't3_3', 't3_4', 't3_5'))
         self.consumed.extend(('t3_6', 't3_7', 't3_8', 't3_9', 't3_10'))
         assert len(self.consumed) == 10
-        assert 't3_1' in self.consumed
-        assert 't3_2' in self.consumed
-        assert 't3_3' in self.consumed
-        assert 't3_4' in self.consumed
-        assert 't3_5' in self.consumed
-        assert 't3_6' in self.consumed
-        assert 't3_7' in self.consumed
-        assert 't3_8' in self.consumed
-        assert 't3_9' in self.consumed
-        assert 't3_10' in self.consumed
-        assert 't3_11' not in self.consumed
-        assert 't3_12' not in self.consumed
-        assert 't3_13' not in self.consumed
-        assert 't3_14' not in self.consumed
-        assert 't3_15' not in self.consumed
+        assert self._present() == {
+            't3_1', 't3_2', 't3_3', 't3_4', 't3_5', 't3_6', 't3_7', 't3_8',
+            't3_9', 't3_10',
+        }
 
         self.consumed.append('t3_11')
         assert len(self.consumed) == 10
-        assert 't3_1' not in self.consumed
-        assert 't3_2' in self.consumed
-        assert 't3_3' in self.consumed
-        assert 't3_4' in self.consumed
-        assert 't3_5' in self.consumed
-        assert 't3_6' in self.consumed
-        assert 't3_7' in self.consumed
-        assert 't3_8' in self.consumed
-        assert 't3_9' in self.consumed
-        assert 't3_10' in self.consumed
-        assert 't3_11' in self.consumed
-        assert 't3_12' not in self.consumed
-        assert 't3_13' not in self.consumed
-        assert 't3_14' not in self.consumed
-        assert 't3_15' not in self.consumed
+        assert self._present() == {
+            't3_2', 't3_3', 't3_4', 't3_5', 't3_6', 't3_7', 't3_8', 't3_9',
+            't3_10', 't3_11',
+        }
 
         self.consumed.extend(('t3_12', 't3_13', 't3_14', 't3_15'))
         assert len(self.consumed) == 10
-        assert 't3_1' not in self.consumed
-        assert 't3_2' not in self.consumed
-        assert 't3_3' not in self.consumed
-        assert 't3_4' not in self.consumed
-        assert 't3_5' not in self.consumed
-        assert 't3_6' in self.consumed
-        assert 't3_7' in self.consumed
-        assert 't3_8' in self.consumed
-        assert 't3_9' in self.consumed
-        assert 't3_10' in self.consumed
-        assert 't3_11' in self.consumed
-        assert 't3_12' in self.consumed
-        assert 't3_13' in self.consumed
-        assert 't3_14' in self.consumed
-        assert 't3_15' in self.consumed
+        assert self._present() == {
+            't3_6', 't3_7', 't3_8', 't3_9', 't3_10', 't3_11', 't3_12', 't3_13',
+            't3_14', 't3_15',
+        }
+
+    def test_extend_with_duplicates(self):
+        self.consumed.extend(('t3_1', 't3_2', 't3_1', u't3_3', 't3_2'))
+        assert len(self.consumed) == 3
+        assert list(self.consumed._deque) == [u't3_1', u't3_2', u't3_3']
+        self.consumed.extend(('t3_3', 't3_4', 't3_4'))
+        assert list(self.consumed._deque) == [
+            u't3_1',
+            u't3_2',
+            u't3_3',
+            u't3_4',
+        ]
+
+    def test_update(self):
+        self.consumed.update(('t3_1', 't3_2'), ['t3_2', 't3_3'], ['t3_4'])
+        assert repr(self.consumed) == (
+            "RecentlyConsumed([u't3_1', u't3_2', u't3_3', u't3_4'], "
+            "key={}, maxlen=10)".format(self.key)
+        )
+
+    def test_batched(self):
+        self.consumed.append('t3_1')
+        with self.consumed.batched():
+            self.consumed.append('t3_2')
+            self.consumed.extend(('t3_3', 't3_4'))
+            with self.consumed.batched():
+                self.consumed.update(('t3_5',))
+            assert 't3_5' in self.consumed
+            assert len(self.consumed) == 5
+            consumed2 = self._consumed()
+            assert repr(consumed2) == (
+                "RecentlyConsumed([u't3_1'], "
+                "key={}, maxlen=10)".format(self.key)
+            )
+        consumed2 = self._consumed()
+        assert repr(consumed2) == repr(self.consumed)
+
+        with self.consumed.batched():
+            self.consumed.clear()
+            self.consumed.extend(('t3_11', 't3_12'))
+        consumed2 = self._consumed()
+        assert repr(consumed2) == (
+            "RecentlyConsumed([u't3_11', u't3_12'], "
+            "key={}, maxlen=10)".format(self.key)
+        )
+
+    def test_flush(self):
+        self.consumed.flush()
+        with self.consumed.batched():
+            self.consumed.extend(('t3_1', 't3_2'))
+            self.consumed.flush()
+            self.consumed.append('t3_3')
+            consumed2 = self._consumed()
+            assert repr(consumed2) == (
+                "RecentlyConsumed([u't3_1', u't3_2'], "
+                "key={}, maxlen=10)".format(self.key)
+            )
+        consumed2 = self._consumed()
+        assert repr(consumed2) == repr(self.consumed)
 
     def test_clear(self):
         self.consumed.extend(('t3_1', 't3_2', 't3_3'))
         self.consumed.clear()
         assert len(self.consumed) == 0
-        assert 't3_1' not in self.consumed
-        assert 't3_2' not in self.consumed
-        assert 't3_3' not in self.consumed
+        assert self._present() == set()
         assert repr(self.consumed) == (
-            "RecentlyConsumed([], key=consumed:rajiv, maxlen=10)"
+            "RecentlyConsumed([], key={}, maxlen=10)".format(self.key)
         )
 
     def test_repr(self):
         assert repr(self.consumed) == (
-            "RecentlyConsumed([], key=consumed:rajiv, maxlen=10)"
+            "RecentlyConsumed([], key={}, maxlen=10)".format(self.key)
         )
 
     def test_repr_when_maxlen_is_none(self):
-        consumed2 = RecentlyConsumed(key='consumed:rajiv', maxlen=None)
-        assert repr(consumed2) == "RecentlyConsumed([], key=consumed:rajiv)"
+        consumed2 = self._consumed(maxlen=None)
+        assert repr(consumed2) == (
+            "RecentlyConsumed([], key={})".format(self.key)
+        )
 
     def test_persistence(self):
         'Ensure that RecentlyConsumed gets persisted in Memcache'
         self.consumed.extend(('t3_1', 't3_2', 't3_3'))
-        consumed2 = RecentlyConsumed(key='consumed:rajiv', maxlen=10)
+        consumed2 = self._consumed()
+        assert repr(consumed2) == (
+            "RecentlyConsumed([u't3_1', u't3_2', u't3_3'], "
+            "key={}, maxlen=10)".format(self.key)
+        )
+
+    def test_persistence_with_newlines(self):
+        'Ensure that values containing our separator survive persistence'
+        self.consumed.extend(('t3_1', 't3_\n2', u't3_\xe9'))
+        consumed2 = self._consumed()
+        assert repr(consumed2) == (
+            "RecentlyConsumed([u't3_1', u't3_\\n2', u't3_\\xe9'], "
+            "key={}, maxlen=10)".format(self.key)
+        )
+
+    def test_loads_legacy_json(self):
+        'Ensure that we can load values that we persisted as JSON'
+        string = json.dumps([u't3_1', u't3_2', u't3_\xe9'])
+        self.consumed.memcache.set(self.key, string, noreply=False)
+        consumed2 = self._consumed()
+        assert repr(consumed2) == (
+            "RecentlyConsumed([u't3_1', u't3_2', u't3_\\xe9'], "
+            "key={}, maxlen=10)".format(self.key)
+        )
+
+    def test_persistence_with_appends(self):
+        'Ensure that appending to Memcache persists the same values'
+        self.consumed.append('t3_1')
+        self.consumed.extend(('t3_2', 't3_3'))
+        self.consumed.append('t3_4')
+        assert self.consumed.memcache.get(self.key) == (
+            '\x01t3_1\nt3_2\nt3_3\nt3_4'
+        )
+        self.consumed.extend(('t3_5', 't3_6', 't3_7', 't3_8', 't3_9', 't3_10'))
+        self.consumed.append('t3_11')
+        consumed2 = self._consumed()
+        assert repr(consumed2) == repr(self.consumed)
+        assert 't3_1' not in consumed2
+        assert 't3_11' in consumed2
+
+    def test_persistence_with_appends_after_eviction(self):
+        'Ensure that we rewrite our values if Memcache evicted them'
+        self.consumed.extend(('t3_1', 't3_2'))
+        MEMCACHE.delete(self.key, noreply=False)
+        RecentlyConsumed._NOREPLY = True
+        try:
+            self.consumed.append('t3_3')
+        finally:
+            RecentlyConsumed._NOREPLY = False
+        consumed2 = self._consumed()
         assert repr(consumed2) == (
             "RecentlyConsumed([u't3_1', u't3_2', u't3_3'], "
-            "key=consumed:rajiv, maxlen=10)"
+            "key={}, maxlen=10)".format(self.key)
         )
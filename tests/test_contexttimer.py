@@ -6,21 +6,29 @@
 #-----------------------------------------------------------------------------#
 
 
-import time
 import unittest
 
 from bloom import ContextTimer
+from tests.fakes import FakeClock
 
 
 class ContextTimerTests(unittest.TestCase):
-    ACCURACY = 50.0     # in milliseconds
+    'Test ContextTimer against a fake clock, rather than actually sleep.'
 
     def setUp(self):
         super(ContextTimerTests, self).setUp()
+        # Like a real clock, never read 0.
+        self.clock = FakeClock(now=1000.0)
+        self._timer = ContextTimer.__dict__['_timer']
+        ContextTimer._timer = staticmethod(self.clock.time)
         self.timer = ContextTimer()
 
+    def tearDown(self):
+        ContextTimer._timer = self._timer
+        super(ContextTimerTests, self).tearDown()
+
     def _confirm_elapsed(self, expected):
-        got = round(self.timer.elapsed() / self.ACCURACY) * self.ACCURACY
+        got = self.timer.elapsed()
         assert got == expected, '{} != {}'.format(got, expected)
 
     def test_start_stop_and_elapsed(self):
@@ -34,14 +42,14 @@ class ContextTimerTests(unittest.TestCase):
         self.timer.start()
         with self.assertRaises(RuntimeError):
             self.timer.start()
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
         self._confirm_elapsed(1*100)
         self.timer.stop()
 
         # timer has been stopped
         with self.assertRaises(RuntimeError):
             self.timer.start()
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
         self._confirm_elapsed(1*100)
         with self.assertRaises(RuntimeError):
             self.timer.stop()
@@ -50,10 +58,10 @@ class ContextTimerTests(unittest.TestCase):
         with self.timer:
             self._confirm_elapsed(0)
             for iteration in range(1, 3):
-                time.sleep(0.1)
+                self.clock.sleep(0.1)
                 self._confirm_elapsed(iteration*100)
             self._confirm_elapsed(iteration*100)
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
         self._confirm_elapsed(iteration*100)
 
         with self.assertRaises(RuntimeError), self.timer:
@@ -8,22 +8,22 @@
 
 import doctest
 import importlib
-import os
+import pkgutil
 import unittest
 
+import bloom
 
-class DoctestTests(unittest.TestCase):
-    def _modules(self):
-        test_dir = os.path.dirname(__file__)
-        package_dir = os.path.dirname(test_dir)
-        source_dir = os.path.join(package_dir, 'bloom')
-        source_files = (f for f in os.listdir(source_dir) if f.endswith('.py'))
-        for source_file in source_files:
-            module_name = os.path.splitext(source_file)[0]
-            module = importlib.import_module('bloom.{}'.format(module_name))
-            yield module
 
+# List our package's modules once, when we're first imported.
+MODULE_NAMES = tuple(
+    'bloom.' + module_name
+    for _, module_name, _ in pkgutil.iter_modules(bloom.__path__)
+)
+
+
+class DoctestTests(unittest.TestCase):
     def test_doctests(self):
-        for module in self._modules():
+        for module_name in MODULE_NAMES:
+            module = importlib.import_module(module_name)
             results = doctest.testmod(m=module)
-            assert not results.failed
+            assert not results.failed, module_name
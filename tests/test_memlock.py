@@ -6,27 +6,47 @@
 #-----------------------------------------------------------------------------#
 
 
+import os
 import time
 import unittest
 
-from bloom import ContextTimer, MemLock, ReleaseUnlockedLock
+from pymemcache.client.base import Client
+
+from bloom import MemLock, ReleaseUnlockedLock
+from tests.fakes import FakeClock
+
+
+# Share one Memcache connection across all of our tests, rather than connect
+# to Memcache again for every single object that we construct.
+MEMCACHE = Client(
+    MemLock._DEFAULT_MEMCACHE_SERVER,
+    connect_timeout=1,
+    timeout=1,
+    no_delay=True,
+)
 
 
 class MemLockTests(unittest.TestCase):
-    def setUp(self):
-        super(MemLockTests, self).setUp()
-        self.memlock = MemLock(key='printer')
-        self._release()
+    @classmethod
+    def setUpClass(cls):
+        super(MemLockTests, cls).setUpClass()
 
-    def tearDown(self):
-        self._release()
-        super(MemLockTests, self).tearDown()
+        # Give each test its own lock, so that our tests can't step on each
+        # other's toes, then delete all of our locks at once at the end.  Our
+        # locks' keys include our process ID too, so that test runs in
+        # parallel processes against the same Memcache can't collide.
+        cls.keys = set()
 
-    def _release(self):
-        try:
-            self.memlock.release()
-        except ReleaseUnlockedLock:
-            pass
+    @classmethod
+    def tearDownClass(cls):
+        MEMCACHE.delete_many(cls.keys, noreply=False)
+        super(MemLockTests, cls).tearDownClass()
+
+    def setUp(self):
+        super(MemLockTests, self).setUp()
+        self.key = 'printer:{}:{}'.format(os.getpid(), self._testMethodName)
+        self.keys.add(self.key)
+        self.memlock = MemLock(memcache=MEMCACHE, key=self.key)
 
     def test_acquire_and_time_out(self):
         assert not self.memlock.locked()
@@ -35,15 +55,6 @@ class MemLockTests(unittest.TestCase):
         time.sleep(self.memlock.auto_release_time)
         assert not self.memlock.locked()
 
-    def test_acquire_same_lock_twice_blocking_without_timeout(self):
-        with ContextTimer() as timer:
-            assert not self.memlock.locked()
-            assert self.memlock.acquire()
-            assert self.memlock.locked()
-            assert self.memlock.acquire()
-            assert self.memlock.locked()
-            assert timer.elapsed() > self.memlock.auto_release_time
-
     def test_acquire_same_lock_twice_blocking_with_timeout(self):
         assert not self.memlock.locked()
         assert self.memlock.acquire()
@@ -51,15 +62,6 @@ class MemLockTests(unittest.TestCase):
         assert not self.memlock.acquire(timeout=0)
         assert self.memlock.locked()
 
-    def test_acquire_same_lock_twice_non_blocking_without_timeout(self):
-        assert not self.memlock.locked()
-        assert self.memlock.acquire()
-        assert self.memlock.locked()
-        assert not self.memlock.acquire(blocking=False)
-        assert self.memlock.locked()
-        time.sleep(self.memlock.auto_release_time)
-        assert not self.memlock.locked()
-
     def test_acquire_same_lock_twice_non_blocking_with_timeout(self):
         assert not self.memlock.locked()
         assert self.memlock.acquire()
@@ -86,7 +88,7 @@ class MemLockTests(unittest.TestCase):
             self.memlock.release()
         except ReleaseUnlockedLock as err:
             assert repr(err) == (
-                '<ReleaseUnlockedLock key=printer retriable=False>'
+                '<ReleaseUnlockedLock key={} retriable=False>'.format(self.key)
             )
 
     def test_release_same_lock_twice(self):
@@ -105,21 +107,133 @@ class MemLockTests(unittest.TestCase):
             assert self.memlock.locked()
         assert not self.memlock.locked()
 
-    def test_context_manager_time_out_before_exit(self):
+    def test_context_manager_release_before_exit(self):
         assert not self.memlock.locked()
         with self.assertRaises(ReleaseUnlockedLock), self.memlock:
             assert self.memlock.locked()
-            time.sleep(self.memlock.auto_release_time)
+            self.memlock.release()
             assert not self.memlock.locked()
         assert not self.memlock.locked()
 
-    def test_context_manager_release_before_exit(self):
+    def test_repr(self):
+        unlocked = '<MemLock key={} locked=False>'.format(self.key)
+        locked = '<MemLock key={} locked=True>'.format(self.key)
+        assert repr(self.memlock) == unlocked
+        assert self.memlock.acquire()
+        assert repr(self.memlock) == locked
+        self.memlock.release()
+        assert repr(self.memlock) == unlocked
+
+
+class FakeMemcache(object):
+    'In-memory stand-in for the few Memcache commands that MemLock issues.'
+
+    def __init__(self, clock):
+        super(FakeMemcache, self).__init__()
+        self._clock = clock
+        self._values = {}
+
+    def _get(self, key):
+        value, expires_at = self._values.get(key, (None, None))
+        if expires_at is not None and expires_at <= self._clock.time():
+            del self._values[key]
+            value = None
+        return value
+
+    def add(self, key, value, expire=0, noreply=None):
+        if self._get(key) is not None:
+            return False
+        expires_at = self._clock.time() + expire if expire else None
+        self._values[key] = (value, expires_at)
+        return True
+
+    def get(self, key):
+        return self._get(key)
+
+    def delete(self, key, noreply=None):
+        if self._get(key) is None:
+            return False
+        del self._values[key]
+        return True
+
+
+class FakeClockMemLockTests(unittest.TestCase):
+    'Test MemLock timeouts against a fake clock, rather than actually wait.'
+
+    def setUp(self):
+        super(FakeClockMemLockTests, self).setUp()
+        self.clock = FakeClock()
+        self._timer = MemLock.__dict__['_timer']
+        self._sleep = MemLock.__dict__['_sleep']
+        MemLock._timer = staticmethod(self.clock.time)
+        MemLock._sleep = staticmethod(self.clock.sleep)
+        self.memcache = FakeMemcache(self.clock)
+        self.memlock = MemLock(memcache=self.memcache, key='printer')
+
+    def tearDown(self):
+        MemLock._timer = self._timer
+        MemLock._sleep = self._sleep
+        super(FakeClockMemLockTests, self).tearDown()
+
+    def test_acquire_same_lock_twice_blocking_without_timeout(self):
+        assert not self.memlock.locked()
+        assert self.memlock.acquire()
+        assert self.memlock.locked()
+        assert self.memlock.acquire()
+        assert self.memlock.locked()
+        assert self.clock.now >= self.memlock.auto_release_time
+
+    def test_acquire_blocking_times_out(self):
+        assert self.memlock.acquire()
+        assert not self.memlock.acquire(timeout=0.5)
+        assert 0.5 <= self.clock.now < self.memlock.auto_release_time
+        assert self.memlock.locked()
+
+    def test_acquire_same_lock_twice_non_blocking_without_timeout(self):
+        assert not self.memlock.locked()
+        assert self.memlock.acquire()
+        assert self.memlock.locked()
+        assert not self.memlock.acquire(blocking=False)
+        assert self.memlock.locked()
+        self.clock.sleep(self.memlock.auto_release_time)
+        assert not self.memlock.locked()
+
+    def test_context_manager_time_out_before_exit(self):
         assert not self.memlock.locked()
         with self.assertRaises(ReleaseUnlockedLock), self.memlock:
             assert self.memlock.locked()
-            self.memlock.release()
+            self.clock.sleep(self.memlock.auto_release_time)
             assert not self.memlock.locked()
         assert not self.memlock.locked()
 
-    def test_repr(self):
-        assert repr(self.memlock) == '<MemLock key=printer locked=False>'
+    def test_repr_after_time_out(self):
+        unlocked = '<MemLock key=printer locked=False>'
+        locked = '<MemLock key=printer locked=True>'
+        assert self.memlock.acquire()
+        assert repr(self.memlock) == locked
+        self.clock.sleep(self.memlock.auto_release_time)
+        assert repr(self.memlock) == unlocked
+
+    def test_retry_delay_capped_by_auto_release_time(self):
+        memlock = MemLock(
+            memcache=self.memcache,
+            key='printer',
+            auto_release_time=0.1,
+        )
+        assert memlock.acquire()
+        assert memlock.acquire()
+        assert self.clock.now >= memlock.auto_release_time
+        assert max(self.clock.sleeps) <= memlock.auto_release_time / 4
+
+    def test_never_auto_release(self):
+        memlock = MemLock(
+            memcache=self.memcache,
+            key='printer',
+            auto_release_time=0,
+        )
+        assert memlock.acquire()
+        assert not memlock.acquire(timeout=1)
+        assert max(self.clock.sleeps) > 0
+        assert len(self.clock.sleeps) < 100
+        self.clock.sleep(100)
+        assert repr(memlock) == '<MemLock key=printer locked=True>'